@@ -34,6 +34,13 @@ Self-hits:
 - By default self hits (query == target after normalization) are skipped. Disable with
   --keep-selfhits.
 
+Parallelism:
+- Motif files are processed independently across --workers processes (default: the
+  CPUs this process may run on, i.e. the SLURM/cgroup allocation rather than the whole
+  node; 1 where that cannot be determined). Each worker holds its own copy of the
+  lookup, so lower --workers on memory-tight allocations. Results are written in file
+  order, so output is identical to --workers 1.
+
 Sorting:
 - This script does NOT sort output; you can sort afterwards with:
     sort -k1,1 -k3,3nr combined.tsv > combined.sorted.tsv
@@ -52,10 +59,33 @@ from __future__ import annotations
 import argparse
 import sys
 import os
+import fnmatch
 import glob
-from typing import Iterable, Tuple, Optional, Set, List
+import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Iterable, Iterator, Tuple, Optional, Set, FrozenSet, List
+
+# One or more stacked structure extensions at the end of an ID (e.g. .pdb.gz)
+STRUCT_EXT_RE = re.compile(r'(?:\.(?:pdb|cif|ent|gz))+$', re.IGNORECASE)
+# Just the final one
+STRUCT_EXT_TAIL_RE = re.compile(r'\.(?:pdb|cif|ent|gz)$', re.IGNORECASE)
+GLOB_MAGIC_RE = re.compile(r'[*?[]')
+# Strings accepted by float(): decimal/exponent forms (with _ digit grouping), inf, nan.
+# Padding is \s minus \x1c-\x1f, which re treats as whitespace but float() rejects.
+_DIGITS = r'\d(?:_?\d)*'
+_PAD = r'[^\S\x1c-\x1f]*'
+SCORE_RE = re.compile(
+    rf'{_PAD}[+-]?(?:(?:(?:{_DIGITS})?\.{_DIGITS}|{_DIGITS}\.?)(?:e[+-]?{_DIGITS})?|inf(?:inity)?|nan){_PAD}',
+    re.IGNORECASE,
+)
+LOOKUP_ID_RE = re.compile(r'^(?!#)([^\t\n]+)', re.MULTILINE)
 
-STRUCT_EXTS = [".pdb", ".cif", ".ent", ".gz"]
+def default_workers() -> int:
+    # Allowed CPUs, not os.cpu_count(): under SLURM the latter reports every core on the node
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0)) or 1
+    return 1
 
 def parse_args() -> argparse.Namespace:
     p = argparse.ArgumentParser(description="Combine motif outputs into a benchmark-ready TSV.")
@@ -76,81 +106,194 @@ def parse_args() -> argparse.Namespace:
     p.add_argument("--whitespace", action="store_true", help="Force splitting on any whitespace (ignore tabs)")
     p.add_argument("--min-fields", type=int, default=2, help="Minimum fields required in a motif line (default 2)")
     p.add_argument("--report-missing", help="Write unique missing (non-lookup) IDs to this file for inspection")
+    p.add_argument("--workers", type=int, default=default_workers(), help="Parallel worker processes for motif files (default: CPUs allocated to this process; 1 = in-process)")
     return p.parse_args()
 
-def load_lookup(path: str) -> Set[str]:
-    valid: Set[str] = set()
+def load_lookup(path: str) -> FrozenSet[str]:
     with open(path, 'r') as fh:
-        for line in fh:
-            if not line.strip() or line.startswith('#'):
-                continue
-            first = line.split('\t', 1)[0].strip()
-            if first:
-                valid.add(first)
-    return valid
+        text = fh.read()
+    # First tab-separated field of every non-comment line, in one regex pass
+    return frozenset(x for x in (m.strip() for m in LOOKUP_ID_RE.findall(text)) if x)
 
-def cleanup_id(raw: str, lower: bool, lookup: Optional[Set[str]]) -> Optional[str]:
+@lru_cache(maxsize=1 << 20)
+def _clean_cached(raw: str, lower: bool) -> str:
+    """Lookup-independent part of cleanup_id (basename, extensions, case), memoized
+    since the same target IDs recur across rows and motif files."""
     x = raw.strip()
     # If a path slipped through, keep only basename
     if '/' in x:
         x = x.rsplit('/', 1)[-1]
     # Remove obvious file extensions that might have crept in
-    done = False
-    while not done:
-        done = True
-        for ext in STRUCT_EXTS:
-            if x.lower().endswith(ext):
-                x = x[: -len(ext)]
-                done = False
+    x = STRUCT_EXT_RE.sub('', x)
     if lower:
         x = x.lower()
+    # Interned so every row/cache entry for the same ID shares one string object
+    return sys.intern(x)
+
+def cleanup_id(raw: str, lower: bool, lookup: Optional[FrozenSet[str]]) -> Optional[str]:
+    x = _clean_cached(raw, lower)
     # If lookup provided, attempt minimal repairs
     if lookup is not None:
         if x in lookup:
             return x
         # Try appending underscore if missing
         if not x.endswith('_') and (x + '_') in lookup:
-            return x + '_'
+            return sys.intern(x + '_')
         # Try removing underscore if present and other form exists
         if x.endswith('_') and x[:-1] in lookup:
-            return x[:-1]
+            return sys.intern(x[:-1])
         # Otherwise return None to signal unknown (caller may decide to keep)
         return None
     return x
 
+def _iter_matching(root: str, pattern: str, recursive: bool) -> Iterator[str]:
+    """os.scandir walk yielding files under root whose name matches pattern.
+
+    Mirrors glob: hidden entries are skipped unless the pattern starts with '.', and
+    unreadable directories are ignored. Patterns of the form '*<literal>' are matched
+    with a plain endswith instead of fnmatch.
+    """
+    suffix = pattern[1:] if pattern.startswith('*') and not GLOB_MAGIC_RE.search(pattern[1:]) else None
+    show_hidden = pattern.startswith('.')
+    try:
+        entries = list(os.scandir(root))
+    except OSError:
+        return
+    for entry in entries:
+        if entry.name.startswith('.') and not show_hidden:
+            continue
+        if entry.is_file():
+            if entry.name.endswith(suffix) if suffix is not None else fnmatch.fnmatch(entry.name, pattern):
+                yield entry.path
+        elif recursive and entry.is_dir():
+            yield from _iter_matching(entry.path, pattern, recursive)
+
 def motif_files(input_dir: str, pattern: str, recursive: bool) -> List[str]:
-    if recursive:
-        return sorted(glob.glob(os.path.join(input_dir, "**", pattern), recursive=True))
-    return sorted(glob.glob(os.path.join(input_dir, pattern)))
+    # The scandir walker matches file names only; patterns with a directory part go to glob
+    if os.sep in pattern or (os.altsep and os.altsep in pattern):
+        if recursive:
+            return sorted(glob.glob(os.path.join(input_dir, "**", pattern), recursive=True))
+        return sorted(glob.glob(os.path.join(input_dir, pattern)))
+    # Sorted so output order and --max-files selection do not depend on directory order
+    return sorted(_iter_matching(input_dir, pattern, recursive))
 
 def extract_query_id(path: str) -> str:
     base = os.path.basename(path)
     return base.rsplit('_', 1)[0]
 
 def iter_motif_lines(path: str, target_col: int, score_col: int, min_fields: int, whitespace: bool) -> Iterable[Tuple[str, str]]:
+    # Only split as far as needed: indexes <= max column are exact fields, the final
+    # element soaks up the rest of the line; sized so the min_fields check stays valid.
+    # Negative columns count from the end, so they need every field: split unbounded.
+    if target_col < 0 or score_col < 0:
+        maxsplit = -1
+    else:
+        maxsplit = max(target_col + 1, score_col + 1, min_fields - 1)
+    # One buffered read + C-level line split instead of iterating the text stream.
+    # Text mode already normalized newlines to '\n'; str.splitlines would also break
+    # on \x1c, \x0c, \u2028 etc., which line iteration never did.
     with open(path, 'r') as fh:
-        for line in fh:
-            stripped = line.strip()
-            if not stripped or stripped.startswith('#'):
-                continue
-            if whitespace:
-                parts = stripped.split()
-            else:
-                parts = stripped.split('\t')
-                if len(parts) < min_fields:
-                    parts = stripped.split()
+        lines = fh.read().split('\n')
+    for line in lines:
+        stripped = line.strip()
+        if not stripped or stripped[0] == '#':
+            continue
+        if whitespace:
+            parts = stripped.split(None, maxsplit)
+        else:
+            parts = stripped.split('\t', maxsplit)
             if len(parts) < min_fields:
+                parts = stripped.split(None, maxsplit)
+        if len(parts) < min_fields:
+            continue
+        if target_col >= len(parts) or score_col >= len(parts):
+            continue
+        yield parts[target_col], parts[score_col]
+
+# Per-worker state set once by _init_worker, so the (potentially multi-million entry)
+# lookup set is shipped to each process once instead of being pickled per file.
+_LOOKUP: Optional[FrozenSet[str]] = None
+_ARGS: Optional[argparse.Namespace] = None
+
+# (encoded output rows, raw lines, kept, self hits, lookup misses, missing IDs)
+FileResult = Tuple[bytes, int, int, int, int, Set[str]]
+
+def _init_worker(lookup: Optional[FrozenSet[str]], args: argparse.Namespace) -> None:
+    global _LOOKUP, _ARGS
+    _LOOKUP = lookup
+    _ARGS = args
+    _resolve_target.cache_clear()
+
+@lru_cache(maxsize=1 << 20)
+def _resolve_target(raw: str, lower: bool) -> Optional[str]:
+    """cleanup_id against this worker's _LOOKUP, memoized so a repeated target (hit or
+    miss) costs one cache probe instead of up to three probes of the large lookup set."""
+    return cleanup_id(raw, lower, _LOOKUP)
+
+def process_file(fpath: str) -> Optional[FileResult]:
+    """Clean and filter one motif file; returns None if its query ID is rejected by the lookup."""
+    args = _ARGS
+    lookup = _LOOKUP
+    lower_flag = not args.no_lower
+    q_raw = extract_query_id(fpath)
+    q_clean = cleanup_id(q_raw, lower_flag, lookup)
+    if q_clean is None:
+        if lookup is not None and not args.keep_nonlookup:
+            return None
+        q_clean = q_raw.lower() if lower_flag else q_raw
+    n_raw = 0
+    n_self = 0
+    n_missing = 0
+    missing_ids: Set[str] = set()
+    rows: List[str] = []
+    for target_raw, score_txt in iter_motif_lines(fpath, args.target_col, args.score_col, args.min_fields, args.whitespace):
+        n_raw += 1
+        t_clean = _resolve_target(target_raw, lower_flag)
+        if t_clean is None:
+            if lookup is not None and not args.keep_nonlookup:
+                n_missing += 1
+                # collect basename/id fragment for reporting
+                missed = target_raw.strip()
+                if '/' in missed:
+                    missed = missed.rsplit('/',1)[-1]
+                missing_ids.add(sys.intern(missed))
                 continue
-            if target_col >= len(parts) or score_col >= len(parts):
-                continue
-            target = parts[target_col]
-            score = parts[score_col]
-            yield target, score
+            # fallback keep raw (basename already stripped in cleanup attempt?)
+            fallback = target_raw.strip()
+            if '/' in fallback:
+                fallback = fallback.rsplit('/',1)[-1]
+            # strip the last extension for readability
+            fallback = STRUCT_EXT_TAIL_RE.sub('', fallback, count=1)
+            t_clean = fallback.lower() if lower_flag else fallback
+        # Drop self hits if requested
+        if not args.keep_selfhits and q_clean == t_clean:
+            n_self += 1
+            continue
+        # Validate score; regex pre-check so malformed rows cost no raised ValueError
+        if SCORE_RE.fullmatch(score_txt) is None:
+            continue
+        try:
+            score = float(score_txt)
+        except ValueError:
+            # regex/float() grammar mismatch: drop the row rather than abort the run
+            continue
+        rows.append(f"{q_clean}\t{t_clean}\t{score}\n")
+    # Encoded in the worker so the main process only copies bytes into the output buffer
+    return ''.join(rows).encode(), n_raw, len(rows), n_self, n_missing, missing_ids
+
+def iter_file_results(files: List[str], lookup: Optional[FrozenSet[str]], args: argparse.Namespace) -> Iterator[Optional[FileResult]]:
+    """Yield process_file results in input order, fanning out over a process pool when --workers > 1."""
+    if args.workers <= 1 or len(files) == 1:
+        _init_worker(lookup, args)
+        yield from map(process_file, files)
+        return
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=(lookup, args)) as pool:
+        yield from pool.map(process_file, files, chunksize=16)
 
 def main() -> int:
     args = parse_args()
 
-    lookup: Optional[Set[str]] = None
+    lookup: Optional[FrozenSet[str]] = None
     if args.scop_lookup:
         if not os.path.isfile(args.scop_lookup):
             print(f"[ERROR] SCOP lookup file not found: {args.scop_lookup}", file=sys.stderr)
@@ -168,7 +311,6 @@ def main() -> int:
     if args.verbose:
         print(f"[INFO] Found {len(files)} motif files", file=sys.stderr)
 
-    lower_flag = not args.no_lower
     total_raw_lines = 0
     total_kept = 0
     total_self = 0
@@ -180,54 +322,24 @@ def main() -> int:
         out_dir = os.path.dirname(os.path.abspath(args.output))
         if out_dir and not os.path.isdir(out_dir):
             os.makedirs(out_dir, exist_ok=True)
-        out_fh = open(args.output, 'w')
+        out_fh = open(args.output, 'wb', buffering=1 << 20)
         if args.add_header:
-            out_fh.write("query_id\ttarget_id\tscore\n")
+            out_fh.write(b"query_id\ttarget_id\tscore\n")
 
     try:
-        for fpath in files:
-            q_raw = extract_query_id(fpath)
-            q_clean = cleanup_id(q_raw, lower_flag, lookup)
-            if q_clean is None:
-                if lookup is not None and not args.keep_nonlookup:
-                    if args.verbose > 1:
-                        print(f"[SKIP] Query ID {q_raw} not in lookup", file=sys.stderr)
-                    continue
-                q_clean = q_raw.lower() if lower_flag else q_raw
-            for target_raw, score_txt in iter_motif_lines(fpath, args.target_col, args.score_col, args.min_fields, args.whitespace):
-                total_raw_lines += 1
-                t_clean = cleanup_id(target_raw, lower_flag, lookup)
-                if t_clean is None:
-                    if lookup is not None and not args.keep_nonlookup:
-                        total_lookup_missing += 1
-                        # collect basename/id fragment for reporting
-                        missed = target_raw.strip()
-                        if '/' in missed:
-                            missed = missed.rsplit('/',1)[-1]
-                        missing_ids.add(missed)
-                        continue
-                    # fallback keep raw (basename already stripped in cleanup attempt?)
-                    fallback = target_raw.strip()
-                    if '/' in fallback:
-                        fallback = fallback.rsplit('/',1)[-1]
-                    # strip extension manually for readability
-                    for ext in STRUCT_EXTS:
-                        if fallback.lower().endswith(ext):
-                            fallback = fallback[: -len(ext)]
-                            break
-                    t_clean = fallback.lower() if lower_flag else fallback
-                # Drop self hits if requested
-                if not args.keep_selfhits and q_clean == t_clean:
-                    total_self += 1
-                    continue
-                # Validate score
-                try:
-                    score = float(score_txt)
-                except ValueError:
-                    continue
-                if out_fh:
-                    out_fh.write(f"{q_clean}\t{t_clean}\t{score}\n")
-                total_kept += 1
+        for fpath, result in zip(files, iter_file_results(files, lookup, args)):
+            if result is None:
+                if args.verbose > 1:
+                    print(f"[SKIP] Query ID {extract_query_id(fpath)} not in lookup", file=sys.stderr)
+                continue
+            blob, n_raw, n_kept, n_self, n_missing, file_missing = result
+            if out_fh:
+                out_fh.write(blob)
+            total_raw_lines += n_raw
+            total_kept += n_kept
+            total_self += n_self
+            total_lookup_missing += n_missing
+            missing_ids.update(file_missing)
     finally:
         if out_fh:
             out_fh.close()
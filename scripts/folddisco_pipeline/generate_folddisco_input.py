@@ -35,13 +35,19 @@ from __future__ import annotations
 
 import argparse
 import math
+import os
 import sys
+from bisect import bisect_left
 from pathlib import Path
-from typing import List, Tuple
+from typing import Dict, List, Tuple
 
 import re
 
+import numpy as np
+
 ID_RE = re.compile(r'^>([^\s]+)')
+SPLIT_RE = re.compile(r'[\s,;]+')
+ID_PARTS_RE = re.compile(r'^(.*?)(?:_([A-Za-z0-9]))?$')
 
 # python scripts/generate_folddisco_input.py --ids /p/scratch/hai_1072/reimt/data/scop40pdb/PGP_out/ids.txt --scores /p/scratch/hai_1072/reimt/data/scop40pdb/PGP_out/conservation_pred.txt --pdb-dir /p/scratch/hai_1072/reimt/data/scop40pdb/pdb --percent 20 --out /p/scratch/hai_1072/reimt/data/scop40pdb/folddisco/input/folddisco_in.txt --with-output-path --output-dir /p/scratch/hai_1072/reimt/data/scop40pdb/folddisco/out --verbose
 def parse_args():
@@ -72,121 +78,150 @@ def read_ids(path: Path) -> List[str]:
     return ids
 
 
-def read_scores(path: Path) -> List[List[float]]:
-    all_scores: List[List[float]] = []
-    with path.open() as fh:
-        for line in fh:
-            line = line.strip()
-            if not line:
-                all_scores.append([])
-                continue
-            # Detect if the line is one long un-delimited digit sequence (e.g. conservation digits)
-            if re.fullmatch(r'[0-9]+', line):
-                # Interpret each digit as an integer score (optionally normalize later)
-                row = [float(int(ch)) for ch in line]
-            else:
-                parts = [p for p in re.split(r'[\s,;]+', line) if p]
-                row: List[float] = []
-                for p_ in parts:
-                    try:
-                        row.append(float(p_))
-                    except ValueError:
-                        row.append(float('nan'))
-            all_scores.append(row)
+def read_scores(path: Path) -> List[np.ndarray]:
+    all_scores: List[np.ndarray] = []
+    # Single bulk read; bytes.splitlines matches text-mode universal newlines
+    with path.open('rb') as fh:
+        lines = fh.read().splitlines()
+    for line in lines:
+        line = line.strip()
+        if not line:
+            all_scores.append(np.empty(0, dtype=np.float64))
+            continue
+        # Detect if the line is one long un-delimited digit sequence (e.g. conservation digits)
+        if line.isdigit():
+            # Interpret each digit as an integer score: the ASCII bytes minus '0', no per-char Python work
+            row = (np.frombuffer(line, dtype=np.uint8) - ord('0')).astype(np.float64)
+        else:
+            parts = [p for p in SPLIT_RE.split(line.decode()) if p]
+            try:
+                row = np.array(parts, dtype=np.float64)
+            except ValueError:
+                # at least one bad token: convert individually, NaN for the bad ones
+                row = np.array([_to_float(p_) for p_ in parts], dtype=np.float64)
+        all_scores.append(row)
     return all_scores
 
 
-def collapse_ranges(chain: str, indices: List[int]) -> List[str]:
-    if not indices:
+def _to_float(token: str) -> float:
+    try:
+        return float(token)
+    except ValueError:
+        return float('nan')
+
+
+def collapse_ranges(indices: np.ndarray) -> List[Tuple[int, int]]:
+    """Collapse residue indices into sorted (start, end) runs of consecutive values."""
+    if len(indices) == 0:
         return []
-    indices = sorted(set(indices))
-    tokens: List[str] = []
+    if len(indices) >= 8:
+        # vectorized run detection: a run breaks wherever the gap to the next index != 1
+        idx = np.unique(indices)
+        breaks = np.flatnonzero(np.diff(idx) != 1) + 1
+        starts = idx[np.r_[0, breaks]]
+        ends = idx[np.r_[breaks - 1, idx.size - 1]]
+        return list(zip(starts.tolist(), ends.tolist()))
+    # small selections: plain loop beats NumPy call overhead
+    indices = sorted(set(np.asarray(indices).tolist()))
+    ranges: List[Tuple[int, int]] = []
     start = prev = indices[0]
     for x in indices[1:]:
         if x == prev + 1:
             prev = x
             continue
-        if start == prev:
-            tokens.append(f"{chain}{start}")
-        else:
-            tokens.append(f"{chain}{start}-{prev}")
+        ranges.append((start, prev))
         start = prev = x
-    if start == prev:
-        tokens.append(f"{chain}{start}")
-    else:
-        tokens.append(f"{chain}{start}-{prev}")
-    return tokens
+    ranges.append((start, prev))
+    return ranges
 
 
+def format_motif(ranges: List[Tuple[str, int, int]]) -> str:
+    """Render (chain, start, end) runs as FoldDisco motif syntax, e.g. A10,A12-15,B3."""
+    return ','.join(f"{c}{s}" if s == e else f"{c}{s}-{e}" for c, s, e in ranges)
 
-def extract_chain(id_str: str) -> str:
-    # Take text after last underscore; fallback 'A'
-    if '_' in id_str:
-        c = id_str.split('_')[-1]
-        # chain can be a single letter or digit
-        if c and len(c) == 1 and (c.isalpha() or c.isdigit()):
-            return c
-    # try trailing letter or digit
-    m = re.search(r'([A-Za-z0-9])$', id_str)
-    if m:
-        return m.group(1)
-    return 'A'
 
+def parse_id(id_str: str) -> Tuple[str, str]:
+    """Split an ID into (base_id, chain) in one regex match.
+
+    A trailing underscore + single chain (letter or digit) is the chain and is stripped
+    from the base. Without one, the base is the ID unchanged and the chain falls back to
+    the ID's trailing letter/digit, else 'A'.
+    """
+    base, chain = ID_PARTS_RE.match(id_str).groups()
+    if chain is None:
+        last = id_str[-1:]
+        chain = last if last.isascii() and last.isalnum() else 'A'
+    return base, chain
+
+
+def list_pdb_dir(pdb_dir: Path) -> List[str]:
+    """Sorted filenames in pdb_dir (empty if it cannot be read), listed once up front."""
+    try:
+        return sorted(os.listdir(pdb_dir))
+    except OSError:
+        return []
 
 
-def base_id(id_str: str) -> str:
-    """Strip a trailing underscore + single chain (letter or digit) if present, else return unchanged."""
-    if '_' in id_str:
-        parts = id_str.split('_')
-        if parts[-1] and len(parts[-1]) == 1 and (parts[-1].isalpha() or parts[-1].isdigit()):
-            return '_'.join(parts[:-1])
-    return id_str
+def _in_sorted(names: List[str], name: str) -> bool:
+    i = bisect_left(names, name)
+    return i < len(names) and names[i] == name
 
 
-def resolve_pdb_path(pdb_dir: Path, original_id: str, merged: bool) -> Path:
+def resolve_pdb_path(pdb_dir: Path, pdb_names: List[str], original_id: str, merged: bool) -> Tuple[Path, bool]:
     """Try multiple filename patterns to locate an existing PDB.
 
+    Existence is checked against pdb_names (sorted listing from list_pdb_dir) rather than
+    stat/glob calls per ID.
+
     Patterns tried in order (first existing is returned):
       1. original_id + '_.pdb'
       2. original_id + '.pdb'
-      3. base_id(original_id) + '_.pdb'
-      4. base_id(original_id) + '.pdb'
-    If none exist, returns the first pattern path (even if missing) so caller can warn.
+      3. parse_id(original_id) base + '_.pdb'
+      4. parse_id(original_id) base + '.pdb'
+    Returns (path, found). If none exist, returns the first pattern path (even if missing)
+    so caller can warn.
     """
-    b = base_id(original_id)
+    b = parse_id(original_id)[0]
     candidates = [
-        pdb_dir / f"{original_id}_.pdb",
-        pdb_dir / f"{original_id}.pdb",
-        pdb_dir / f"{b}_.pdb",
-        pdb_dir / f"{b}.pdb",
+        f"{original_id}_.pdb",
+        f"{original_id}.pdb",
+        f"{b}_.pdb",
+        f"{b}.pdb",
     ]
-    for c in candidates:
-        if c.exists():
-            return c
-    # Try glob for versioned files: <base_id>*.pdb
-    import glob
-    globbed = sorted(pdb_dir.glob(f"{b}*.pdb"))
-    if globbed:
-        return globbed[0]
-    return candidates[0]
-
-
-def select_indices(scores: List[float], percent: float, min_res: int) -> List[int]:
-    # treat NaN as very low score
-    indexed: List[Tuple[int, float]] = []
-    import math as _m
-    for i, s in enumerate(scores, start=1):  # residue indices start at 1
-        if _m.isnan(s):
-            val = -1e9
-        else:
-            val = s
-        indexed.append((i, val))
-    if not indexed:
-        return []
-    indexed.sort(key=lambda t: t[1], reverse=True)
-    k = max(min_res, math.ceil(len(indexed) * (percent / 100.0)))
-    top = indexed[:k]
-    return [i for i, _ in top]
+    for name in candidates:
+        if _in_sorted(pdb_names, name):
+            return pdb_dir / name, True
+    # Versioned files <base_id>*.pdb: first match in sorted order, found by prefix scan
+    i = bisect_left(pdb_names, b)
+    while i < len(pdb_names) and pdb_names[i].startswith(b):
+        name = pdb_names[i]
+        if name.endswith('.pdb') and len(name) >= len(b) + len('.pdb'):
+            return pdb_dir / name, True
+        i += 1
+    return pdb_dir / candidates[0], False
+
+
+def select_indices(scores: np.ndarray, percent: float, min_res: int) -> np.ndarray:
+    """Sorted 1-based int32 indices of the top `percent` (at least min_res) scores."""
+    n = len(scores)
+    if n == 0:
+        return np.empty(0, dtype=np.int32)
+    arr = np.asarray(scores, dtype=np.float64)
+    # treat NaN as very low score; clean rows (the common case) are used as-is, no copy
+    nan_mask = np.isnan(arr)
+    if nan_mask.any():
+        arr = np.where(nan_mask, -np.inf, arr)
+    k = min(n, max(min_res, math.ceil(n * (percent / 100.0))))
+    if k <= 0:
+        return np.empty(0, dtype=np.int32)
+    # O(n) top-k: everything strictly above the k-th largest score, then the
+    # lowest-index ties at that score (same picks as a stable descending sort)
+    kth = np.partition(arr, n - k)[n - k]
+    above = np.flatnonzero(arr > kth)
+    ties = np.flatnonzero(arr == kth)[: k - above.size]
+    idx = np.concatenate((above, ties)).astype(np.int32) + 1  # residue indices start at 1
+    idx.sort()
+    return idx
 
 
 def main():
@@ -218,60 +253,52 @@ def main():
     if args.verbose:
         print(f"Output file will be: {out_path}", file=sys.stderr)
 
+    # (base_id, chain) per ID, parsed once up front
+    parsed = [parse_id(i) for i in ids]
+    pdb_dir = Path(args.pdb_dir)
     rows: List[str] = []
     if args.per_chain:
         # original behavior
-        for id_str, scores in zip(ids, score_lines):
-            if not scores:
+        for id_str, (_, chain), scores in zip(ids, parsed, score_lines):
+            if scores.size == 0:
                 continue
-            chain = extract_chain(id_str)
             sel = select_indices(scores, args.percent, args.min_residues)
-            motif_parts = collapse_ranges(chain, sel)
-            if not motif_parts:
+            if sel.size == 0:
                 continue
-            motif = ','.join(motif_parts)
-            pdb_path = Path(args.pdb_dir) / f"{id_str}_.pdb"
+            motif = format_motif([(chain, start, end) for start, end in collapse_ranges(sel)])
+            pdb_path = pdb_dir / f"{id_str}_.pdb"
             if args.with_output_path and out_dir is not None:
-                stem = f"{id_str}_motif"
-                out_file = out_dir / f"{stem}.out"
-                row = f"{pdb_path}\t{motif}\t{out_file}"
+                out_file = out_dir / f"{id_str}_motif.out"
+                rows.append('\t'.join((os.fspath(pdb_path), motif, os.fspath(out_file))))
             else:
-                row = f"{pdb_path}\t{motif}"
-            rows.append(row)
+                rows.append('\t'.join((os.fspath(pdb_path), motif)))
     else:
         # merge chains by base ID
+        pdb_names = list_pdb_dir(pdb_dir)
         from collections import defaultdict
-        grouped_scores = defaultdict(list)  # base_id -> list of (chain, indices)
-        chain_sel_map = defaultdict(list)   # base_id -> list of (chain, selected_indices)
-        id_to_scores = list(zip(ids, score_lines))
-        for id_str, scores in id_to_scores:
-            if not scores:
+        base_to_ranges: Dict[str, List[Tuple[str, int, int]]] = defaultdict(list)  # base_id -> (chain, start, end) runs
+        for (b, chain), scores in zip(parsed, score_lines):
+            if scores.size == 0:
                 continue
-            chain = extract_chain(id_str)
             sel = select_indices(scores, args.percent, args.min_residues)
-            if not sel:
+            if sel.size == 0:
                 continue
-            b = base_id(id_str)
-            chain_sel_map[b].append((chain, sel))
-        for b, chain_lists in chain_sel_map.items():
-            # build combined motif tokens across chains (each chain collapsed separately)
-            chain_tokens: List[str] = []
-            for chain, indices in chain_lists:
-                chain_tokens.extend(collapse_ranges(chain, indices))
-            motif = ','.join(chain_tokens)
-            pdb_path = resolve_pdb_path(Path(args.pdb_dir), b, merged=True)
-            if args.verbose and not pdb_path.exists():
+            # each chain is collapsed separately, in ID order
+            base_to_ranges[b].extend((chain, start, end) for start, end in collapse_ranges(sel))
+        for b, ranges in base_to_ranges.items():
+            motif = format_motif(ranges)
+            pdb_path, found = resolve_pdb_path(pdb_dir, pdb_names, b, merged=True)
+            if args.verbose and not found:
                 print(f"WARNING: PDB not found for base ID {b} (tried variants)", file=sys.stderr)
             if args.with_output_path and out_dir is not None:
-                stem = f"{b}_motif"
-                out_file = out_dir / f"{stem}.out"
-                row = f"{pdb_path}\t{motif}\t{out_file}"
+                out_file = out_dir / f"{b}_motif.out"
+                rows.append('\t'.join((os.fspath(pdb_path), motif, os.fspath(out_file))))
             else:
-                row = f"{pdb_path}\t{motif}"
-            rows.append(row)
+                rows.append('\t'.join((os.fspath(pdb_path), motif)))
     out_path.parent.mkdir(parents=True, exist_ok=True)
     with out_path.open('w') as fh:
-        fh.write('\n'.join(rows) + ('\n' if rows else ''))
+        # stream rows out rather than building a second, joined copy of the manifest
+        fh.writelines(row + '\n' for row in rows)
     if args.verbose:
         print(f"Wrote {len(rows)} rows to {out_path}", file=sys.stderr)
 
@@ -0,0 +1,22 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from combine_motif_outputs import SCORE_RE
+
+
+def _float_ok(token: str) -> bool:
+    try:
+        float(token)
+    except ValueError:
+        return False
+    return True
+
+
+def test_score_re_matches_float_on_whitespace():
+    spaces = [chr(c) for c in range(0x110000) if chr(c).isspace()]
+    assert spaces
+    for ch in spaces:
+        for token in (ch + '5', '5' + ch, ch + '-1.5e3' + ch, ch):
+            assert (SCORE_RE.fullmatch(token) is not None) == _float_ok(token), repr(token)